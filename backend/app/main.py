@@ -1,13 +1,36 @@
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.routers import chat_bot_router
 from app.routers import auth
+from app.routers.chat_bot import refresh_local_index
 from common.config import settings
-from sqlalchemy import text
-from common.models.db import engine
-app = FastAPI()
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from common.models.db import DATABASE_URL, AsyncSessionLocal
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the in-process retrieval index; /ask falls back to pgvector if
+    # the corpus is too large or the database is unreachable here.
+    if AsyncSessionLocal is not None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await refresh_local_index(db)
+        except Exception as e:
+            print(f"Local retrieval index unavailable at startup: {e}")
+    yield
+
+
+# orjson serializes responses several times faster than the stdlib encoder.
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+
+@lru_cache(maxsize=1)
 def _parse_cors_origins(value: str) -> list[str]:
     raw = (value or "").strip()
     if not raw or raw == "*":
@@ -34,14 +57,36 @@ def read_root():
     return {"status": "ok", "message": "FastAPI backend is running on Render 🚀"}
 
 
+# Probes hit /health every few seconds; give them their own pool-less engine
+# so they never contend with request traffic for connection-pool slots.
+health_engine = (
+    create_engine(DATABASE_URL, poolclass=NullPool, connect_args={"connect_timeout": 2})
+    if DATABASE_URL
+    else None
+)
+
+_HEALTH_TTL_SECONDS = 5.0
+_last_health = (0.0, None)  # (monotonic timestamp, cached response)
+
+
 @app.get("/health")
 def health():
+    global _last_health
+    checked_at, cached = _last_health
+    now = time.monotonic()
+    if cached is not None and now - checked_at < _HEALTH_TTL_SECONDS:
+        return cached
     try:
-        with engine.connect() as conn:
+        if health_engine is None:
+            raise RuntimeError("database is not configured")
+        with health_engine.connect() as conn:
+            conn.execute(text("SET LOCAL statement_timeout = 500"))
             conn.execute(text("SELECT 1"))
-        return {"status": "ok", "database": "ok"}
+        result = {"status": "ok", "database": "ok"}
     except Exception as e:
-        return {"status": "degraded", "database": "unavailable", "detail": str(e)}
+        result = {"status": "degraded", "database": "unavailable", "detail": str(e)}
+    _last_health = (now, result)
+    return result
 
 app.include_router(chat_bot_router)
 # app.include_router(item.router)
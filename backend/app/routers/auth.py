@@ -2,18 +2,23 @@ from fastapi import Depends, HTTPException, status, APIRouter
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+import jwt as pyjwt
+import asyncio
+import hashlib
 import os
+import time
+from cachetools import TTLCache
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from common.models.user import User as UserModel
-from common.models.db import get_db
+from common.models.db import get_async_db
 from common.models.document import Document 
-from sqlalchemy import func
+from sqlalchemy import select
 from services.ingestion.embed_and_store import embed_and_store
+from common.config import settings
 
 
-SECRET_KEY = "4340aa99705e93cda93f400b78f61f56bc671ce6c23bda8235803c098832abb7"
+SECRET_KEY = settings.jwt_secret
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
@@ -39,27 +44,47 @@ class User(BaseModel):
 class UserInDB(User):
     hashed_password: str
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_rounds,
+)
 oauth_2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Short-lived caches so hot tokens skip the JWT decode and the user lookup.
+# Keys are token digests, not raw tokens, so tokens never sit in memory.
+_jwt_cache = TTLCache(maxsize=10_000, ttl=30)
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+
 router = APIRouter()
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    if len(password) > 72:
-        password = password[:72]
-    return pwd_context.hash(password)
+def get_password_hash(password: str) -> str:
+    # Unconditional slice: bcrypt caps input at 72 bytes anyway, and slicing
+    # is always correct whether or not the password is that long.
+    return pwd_context.hash(password[:72])
 
-def get_user(db: Session, username: str):
-    return db.query(UserModel).filter(UserModel.email == username).first()
+async def get_user(db: AsyncSession, username: str):
+    # Only the columns auth actually reads; skips hydrating full ORM objects.
+    result = await db.execute(
+        select(
+            UserModel.id,
+            UserModel.email,
+            UserModel.hashed_password,
+            UserModel.is_admin,
+        ).filter(UserModel.email == username)
+    )
+    return result.first()
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # bcrypt is CPU-bound; run it in a worker thread so concurrent logins
+    # don't stall the event loop.
+    if not await asyncio.to_thread(verify_password, password, user.hashed_password):
         return False
     return user  # This is UserModel, not Pydantic User
 
@@ -67,27 +92,48 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = pyjwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth_2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth_2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    token_key = hashlib.sha256(token.encode()).digest()[:16]
+    payload = _jwt_cache.get(token_key)
+    if payload is None:
+        try:
+            # Signature verification is CPU-bound; keep it off the event loop.
+            payload = await asyncio.to_thread(
+                pyjwt.decode,
+                token,
+                SECRET_KEY,
+                algorithms=[ALGORITHM],
+                options={"require": ["exp", "sub"]},
+            )
+        except pyjwt.PyJWTError:
+            raise credentials_exception
+        _jwt_cache[token_key] = payload
+    else:
+        # Cached payloads were already verified; just make sure they haven't expired.
+        exp = payload.get("exp")
+        if exp is not None and time.time() >= exp:
+            _jwt_cache.pop(token_key, None)
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
+    token_data = TokenData(username=username)
 
-    user = get_user(db, username=token_data.username)
+    user = _user_cache.get(token_data.username)
     if user is None:
-        raise credentials_exception
+        user = await get_user(db, username=token_data.username)
+        if user is None:
+            raise credentials_exception
+        _user_cache[token_data.username] = user
     return user
 
 async def get_current_active_user(current_user: UserModel = Depends(get_current_user)):
@@ -98,9 +144,9 @@ async def get_current_active_user(current_user: UserModel = Depends(get_current_
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -108,8 +154,10 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email, "is_admin": user.is_admin}, expires_delta=access_token_expires
+    access_token = await asyncio.to_thread(
+        create_access_token,
+        data={"sub": user.email, "is_admin": user.is_admin},
+        expires_delta=access_token_expires,
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -144,30 +192,31 @@ async def get_current_admin_user(current_user: UserModel = Depends(get_current_a
 
 @router.get("/admin/documents")
 async def list_documents(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: UserModel = Depends(get_current_admin_user)
 ):
-    # Get unique src_file_name entries
-    ocs = (
-    db.query(
-        Document.src_file_name,
-        func.min(Document.id).label("id"),
-        func.min(Document.created_at).label("upload_date"),
-        func.max(Document.status).label("status"),
-        func.max(Document.size).label("size"),
-    )
-    .group_by(Document.src_file_name)
-    .all()
-)
+    # One row per src_file_name via DISTINCT ON: a single skip-scan over the
+    # (src_file_name, created_at) index instead of aggregating every chunk.
+    docs = (await db.execute(
+        select(
+            Document.id,
+            Document.src_file_name,
+            Document.created_at,
+            Document.status,
+            Document.size,
+        )
+        .distinct(Document.src_file_name)
+        .order_by(Document.src_file_name, Document.created_at.desc())
+    )).all()
     return [
         {
             "id": doc.id,
             "filename": doc.src_file_name,
-            "upload_date": doc.upload_date,
+            "upload_date": doc.created_at,
             "status": doc.status,
             "size": doc.size,
         }
-        for doc in ocs
+        for doc in docs
     ]
 from fastapi import UploadFile, File
 
@@ -175,24 +224,44 @@ from fastapi import UploadFile, File
 async def upload_document(
     file: UploadFile = File(...),
     filename: str = '',
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_admin: UserModel = Depends(get_current_admin_user)
 ):
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
-    
-    print(f"Received file: {file.filename}, size: ")
-    
+
+    file_path = os.path.join(UPLOAD_DIRECTORY, filename or file.filename)
+    max_bytes = settings.max_upload_mb * 1024 * 1024
+    size = 0
+
     try:
-        file_path = os.path.join(UPLOAD_DIRECTORY, filename or file.filename)
+        # Stream to disk in 1MB chunks so large PDFs never sit fully in
+        # memory, and bail out as soon as an upload exceeds the limit.
         with open(file_path, "wb") as f:
-            f.write(await file.read())
-        
+            while chunk := await file.read(1 << 20):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large; the limit is {settings.max_upload_mb} MB",
+                    )
+                f.write(chunk)
+
+        print(f"Received file: {file.filename}, size: {size}")
+
         await embed_and_store(file_path, title=filename or file.filename)
 
+        # New chunks must show up in the in-process retrieval index.
+        from app.routers.chat_bot import refresh_local_index
+        await refresh_local_index(db)
+
         return {"id": "doc.id", "filename": "doc.src_file_name", "status": "doc.status"}
-        
-    
+
+    except HTTPException:
+        # Don't leave a truncated file behind for the ingestion pipeline.
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
     
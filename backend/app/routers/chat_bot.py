@@ -1,9 +1,16 @@
+import asyncio
+import re
+
+import numpy as np
+
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from common.models.db import get_db
+from common.models.db import get_async_db
 from common.models.document import Document
 from common.config import settings
 from common.core.openai_client import single_embed, chat_completion
@@ -19,10 +26,6 @@ class AskRequest(BaseModel):
     latitude: Optional[float] = Field(None, example=9.03)  # optional
     longitude: Optional[float] = Field(None, example=38.74)  # optional
 
-class AskResponse(BaseModel):
-    answer: str
-    sources: list
-    
 lang_map = {
     "auto": "Auto",
     "en": "English",
@@ -32,149 +35,346 @@ lang_map = {
     "ti": "Tigrinya"
 }
 
+# Small-talk patterns, compiled once at import so each request is a single
+# regex scan instead of a Python loop over substrings.
+greeting_patterns = [
+    "hi", "hello", "hey", "greetings", "good morning", "good afternoon",
+    "good evening", "howdy", "hola", "salut", "namaste",
+    "how are you", "how r u", "how do you do", "what's up", "whats up",
+    "sup", "wassup", "how's it going", "hows it going"
+]
+intro_patterns = [
+    "who are you", "what are you", "who am i talking to", "what is your name",
+    "introduce yourself", "tell me about yourself"
+]
+thanks_patterns = ["thank", "thanks", "thx", "appreciate"]
+
+_GREETING_RE = re.compile(r"\b(" + "|".join(map(re.escape, greeting_patterns)) + r")\b", re.I)
+_INTRO_RE = re.compile(r"\b(" + "|".join(map(re.escape, intro_patterns)) + r")\b", re.I)
+_THANKS_RE = re.compile(r"\b(" + "|".join(map(re.escape, thanks_patterns)) + r")", re.I)
+
+GREETING_RESPONSE = (
+    "Hello! I'm Nile Care AI Farm Advisory, your agricultural assistant. "
+    "I'm here to help answer your farming questions, provide crop advice, "
+    "discuss pest management, soil health, weather impacts, and more. "
+    "How can I assist you today?"
+)
+INTRO_RESPONSE = (
+    "I am Nile Care AI Farm Advisory, your trusted agricultural assistant. "
+    "I'm designed to help farmers and agricultural professionals with farming-related queries, "
+    "provide guidance on crop management, pest control, soil health, weather conditions, "
+    "and offer tailored advice based on agricultural best practices. "
+    "What would you like to know about farming?"
+)
+THANKS_RESPONSE = "You're welcome! Feel free to ask me anything about farming and agriculture."
+
+# Greetings in the supported languages, matched against the raw question so
+# a plain "selam"/"ሰላም" short-circuits before any detect/translate call.
+_MULTILINGUAL_GREETING_RE = re.compile(
+    r"(\bhi\b|\bhello\b|\bhey\b|\bselam\b|\bsalam\b|\bsalaam\b|\bakkam\b|\bnagaa\b"
+    r"|iska warran|ሰላም|ሀሎ|ሃሎ|እንዴት ነህ|እንዴት ነሽ|ከመይ ኣለኻ|ከመይ ኣለኺ)",
+    re.I,
+)
+
+# Pre-translated canned greeting per supported language; "auto" and anything
+# unmapped fall back to English.
+_GREETING_BY_LANG = {
+    "en": GREETING_RESPONSE,
+    "am": (
+        "ሰላም! እኔ Nile Care AI የእርሻ አማካሪ ነኝ። ስለ እርሻ፣ የሰብል እንክብካቤ፣ የተባይ መቆጣጠር፣ "
+        "የአፈር ጤና እና የአየር ሁኔታ ጥያቄዎችዎን ለመመለስ ዝግጁ ነኝ። ዛሬ እንዴት ልርዳዎት?"
+    ),
+    "om": (
+        "Akkam! Ani Nile Care AI, gorsaa qonnaa keessan. Gaaffilee qonnaa, kunuunsa "
+        "midhaanii, to'annoo raammoo, fayyaa biyyee fi haala qilleensaa irratti isin "
+        "gargaaruuf qophaa'eera. Har'a maaliin isin gargaaru?"
+    ),
+    "so": (
+        "Salaam! Waxaan ahay Nile Care AI, la-taliyahaaga beeraha. Waxaan kaa caawin "
+        "karaa su'aalaha beeraha, daryeelka dalagga, xakamaynta cayayaanka, caafimaadka "
+        "carrada iyo cimilada. Sidee maanta kuu caawiyaa?"
+    ),
+    "ti": (
+        "ሰላም! ኣነ Nile Care AI ኣማኻሪ ሕርሻ እየ። ብዛዕባ ሕርሻ፣ ክንክን ኣዝርእቲ፣ ቁጽጽር ባልዕ፣ "
+        "ጥዕና ሓመድን ኩነታት ኣየርን ሕቶታትኩም ክምልስ ድሉው እየ። ሎሚ ብኸመይ ክሕግዘኩም?"
+    ),
+}
+
+# Common English function words; enough to tell an English prompt apart
+# without a round-trip to Google Translate.
+_EN_HINT_RE = re.compile(r"\b(the|is|a|what|how|why|when|where|which|who|and|or)\b", re.I)
+
+# Detection results for repeat prompts so identical questions skip the call.
+_lang_cache = TTLCache(maxsize=2048, ttl=600)
+
+
+def _is_probably_english(text: str) -> bool:
+    return text.isascii() and bool(_EN_HINT_RE.search(text))
+
+
+async def _detect_language_cached(text: str) -> str:
+    key = text.strip().lower()[:200]
+    lang = _lang_cache.get(key)
+    if lang is None:
+        lang = await detect_language(text)
+        if lang:
+            _lang_cache[key] = lang
+    return lang
+
+
+# Repeat questions skip the OpenAI embedding call, and weather for the same
+# city/coordinates is reused for ten minutes.
+_embed_cache = TTLCache(maxsize=4096, ttl=3600)
+_weather_cache = TTLCache(maxsize=1024, ttl=600)
+
+
+async def _cached_embed(question: str) -> list[float]:
+    key = question.strip().lower()
+    embedding = _embed_cache.get(key)
+    if embedding is None:
+        embedding = await single_embed(question)
+        _embed_cache[key] = embedding
+    return embedding
+
+
+async def _cached_weather(city: str = "", lat: float = None, lon: float = None):
+    key = city.strip().lower() if city else (round(lat, 2), round(lon, 2))
+    data = _weather_cache.get(key)
+    if data is None:
+        data = await get_weather(city, lat=lat, lon=lon)
+        if data is not None:
+            _weather_cache[key] = data
+    return data
+
+
+# Frozen at import: settings never change at runtime and the prompt is a
+# multi-kilobyte literal we don't want rebuilt per request.
+K_RETRIEVAL = settings.k_retrieval
+
+SYSTEM_PROMPT = (
+    "You are Nile Care AI Farm Advisory, a specialized agricultural assistant. Your role is to provide concise, clear, "
+    "and informative answers based solely on the context provided. Always answer in the language requested, without "
+    "introducing any other languages. If the question cannot be answered from the provided context, acknowledge this by "
+    "saying, 'I don't know.'\n\n"
+
+    "- **Weather inquiries**: If asked for the weather, offer a concise, accurate report based only on the available data. "
+    "Do not add extra commentary or suggestions.\n\n"
+
+    "- **Tone & Clarity**: Your responses should be professional, easy to understand, and accurate. If the context includes "
+    "technical terms or complex concepts, simplify them for the user’s understanding while maintaining accuracy.\n\n"
+
+    "- **Consistency & Transparency**: If you're unsure about something, communicate that clearly and refrain from guessing. "
+    "Always prioritize honesty in your responses.\n\n"
+
+    "If the user greets you (e.g., 'Hi', 'Hello', 'Good morning'), respond in a friendly, human-like manner, such as:\n"
+    "'Hello! How can I assist you with your farming needs today?' or 'Hi there! How can I help with your agricultural questions?'"
+
+    # Add a response for identifying the assistant
+    "If asked 'Who am I talking to?' or something similar, you should respond with: 'You are talking to Nile Care AI Farm Advisory, "
+    "your trusted agricultural assistant designed to help with farming-related queries and provide tailored guidance based on provided data.'"
+
+    "Don't include any list just return the answer in a paragraph format."
+)
+
+# In-process retrieval shortcut for small corpora: below this row count the
+# whole embedding matrix fits in memory (~60MB at 10k rows) and one BLAS
+# matvec beats a Postgres round-trip per question.
+_LOCAL_INDEX_MAX_ROWS = 10_000
+
+# Contents and matrix are swapped in as a single (contents, matrix) tuple so
+# a request that snapshots the index mid-refresh never mixes new contents
+# with positions computed against the old matrix.
+_local_index = {"data": None}
+
+
+async def refresh_local_index(db: AsyncSession) -> None:
+    """
+    (Re)load document contents and normalized embeddings into memory.
+    Called at startup and after uploads; corpora larger than
+    _LOCAL_INDEX_MAX_ROWS fall back to pgvector retrieval.
+    """
+    count = (await db.execute(select(func.count()).select_from(Document))).scalar()
+    if not count or count > _LOCAL_INDEX_MAX_ROWS:
+        _local_index["data"] = None
+        return
+
+    rows = (await db.execute(select(Document.content, Document.embedding))).all()
+    matrix = np.asarray([np.asarray(row.embedding, dtype=np.float32) for row in rows])
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9
+    _local_index["data"] = ([row.content for row in rows], matrix)
+
+
+# Cap on retrieval context pasted into the prompt; roughly 1500 tokens.
+_MAX_CONTEXT_CHARS = 6000
+
+
+def _bounded_join(chunks, max_chars: int = _MAX_CONTEXT_CHARS) -> str:
+    """
+    Join retrieved chunks with blank lines, truncating once max_chars is hit
+    so oversized chunks can't blow up prompt size and token spend.
+    """
+    total = 0
+    parts = []
+    for chunk in chunks:
+        remaining = max_chars - total
+        if remaining <= 0:
+            break
+        if len(chunk) > remaining:
+            parts.append(chunk[:remaining])
+            break
+        parts.append(chunk)
+        total += len(chunk) + 2  # account for the joining blank line
+    return "\n\n".join(parts)
+
+
+_CLEAN_RE = re.compile(r"\*\*|>>>>")
+
+
 def clean_text(text: str) -> str:
     """
     Optionally, remove unwanted characters like stars (for bolding)
     """
-    text = text.replace("**", "")
-    text = text.replace(">>>>", "")
-    # Add more cleaning logic as needed
-    return text
+    return _CLEAN_RE.sub("", text)
 
 
-@router.post("/ask", response_model=AskResponse)
-async def ask_question(request: AskRequest, db: Session = Depends(get_db)):
+@router.post("/ask")
+async def ask_question(request: AskRequest, db: AsyncSession = Depends(get_async_db)):
     """
         Handle user questions and return answers.
         - request: AskRequest
         - db: Database session
     """
      
+    # Greeting fast path on the raw question: a matched "hello"/"ሰላም" answers
+    # from the canned responses with zero detect/translate round-trips.
+    raw_question = request.question.strip()
+    if _MULTILINGUAL_GREETING_RE.search(raw_question) and len(raw_question.split()) <= 5:
+        greeting = _GREETING_BY_LANG.get(request.lang, GREETING_RESPONSE)
+        return {"answer": greeting, "sources": []}
+
     english_question = request.question
-    question_lang = await detect_language(english_question)
-    
+    # Most traffic is English; skip the detection round-trip when the prompt
+    # is plainly English instead of paying a network hop per request. lang
+    # defaults to "en", so it only counts when the text is actually ASCII —
+    # non-Latin scripts must still go through detection and translation.
+    if (request.lang == "en" and english_question.isascii()) or _is_probably_english(english_question):
+        question_lang = "en"
+    else:
+        question_lang = await _detect_language_cached(english_question)
+
     if question_lang != "en":
         src_lang = request.lang if request.lang != "auto" else question_lang
         english_question = await google_translate(request.question, src_lang=src_lang, dest_lang="en")
 
     # Handle greetings and simple interactions without database query
     question_lower = english_question.lower().strip()
-    greeting_patterns = [
-        "hi", "hello", "hey", "greetings", "good morning", "good afternoon", 
-        "good evening", "howdy", "hola", "salut", "namaste",
-        "how are you", "how r u", "how do you do", "what's up", "whats up",
-        "sup", "wassup", "how's it going", "hows it going"
-    ]
-    intro_patterns = [
-        "who are you", "what are you", "who am i talking to", "what is your name",
-        "introduce yourself", "tell me about yourself"
-    ]
-    thanks_patterns = ["thank", "thanks", "thx", "appreciate"]
-    
+
     # Check for greetings
-    if any(pattern in question_lower for pattern in greeting_patterns) and len(question_lower.split()) <= 5:
-        greeting_response = (
-            "Hello! I'm Nile Care AI Farm Advisory, your agricultural assistant. "
-            "I'm here to help answer your farming questions, provide crop advice, "
-            "discuss pest management, soil health, weather impacts, and more. "
-            "How can I assist you today?"
-        )
+    if _GREETING_RE.search(question_lower) and len(question_lower.split()) <= 5:
+        greeting_response = GREETING_RESPONSE
         if request.lang != "en" and question_lang != "en":
             greeting_response = await google_translate(greeting_response, src_lang="en", dest_lang=question_lang)
-        return AskResponse(answer=greeting_response, sources=[])
-    
+        return {"answer": greeting_response, "sources": []}
+
     # Check for introductions
-    if any(pattern in question_lower for pattern in intro_patterns):
-        intro_response = (
-            "I am Nile Care AI Farm Advisory, your trusted agricultural assistant. "
-            "I'm designed to help farmers and agricultural professionals with farming-related queries, "
-            "provide guidance on crop management, pest control, soil health, weather conditions, "
-            "and offer tailored advice based on agricultural best practices. "
-            "What would you like to know about farming?"
-        )
+    if _INTRO_RE.search(question_lower):
+        intro_response = INTRO_RESPONSE
         if request.lang != "en" and question_lang != "en":
             intro_response = await google_translate(intro_response, src_lang="en", dest_lang=question_lang)
-        return AskResponse(answer=intro_response, sources=[])
-    
+        return {"answer": intro_response, "sources": []}
+
     # Check for thanks
-    if any(pattern in question_lower for pattern in thanks_patterns) and len(question_lower.split()) <= 5:
-        thanks_response = "You're welcome! Feel free to ask me anything about farming and agriculture."
+    if _THANKS_RE.search(question_lower) and len(question_lower.split()) <= 5:
+        thanks_response = THANKS_RESPONSE
         if request.lang != "en" and question_lang != "en":
             thanks_response = await google_translate(thanks_response, src_lang="en", dest_lang=question_lang)
-        return AskResponse(answer=thanks_response, sources=[])
+        return {"answer": thanks_response, "sources": []}
 
-    # Embed the question
-    query_embedding = await single_embed(english_question)
-    
-    # Retrieve relevant chunks from the database
-    try:
-        result = (
-            db.query(Document)
-            .order_by(Document.embedding.cosine_distance(query_embedding))
-            .limit(settings.k_retrieval)
-            .all()
+    # Embed the question and fetch weather concurrently; they are independent
+    # of each other, so total latency is max(embed, weather) + retrieval.
+    embed_task = asyncio.create_task(_cached_embed(english_question))
+    # One weather fetch at most: coordinates are more precise than a
+    # free-text city, so they win when both are supplied. Explicit None
+    # checks keep latitude/longitude 0.0 valid.
+    weather_task = None
+    weather_label = None
+    if request.latitude is not None and request.longitude is not None:
+        weather_task = asyncio.create_task(
+            _cached_weather(lat=request.latitude, lon=request.longitude)
         )
-    except SQLAlchemyError as e:
-        # Check if this is a connection error (IPv6, network, auth, etc.)
-        root_err = getattr(e, "orig", e)
-        err_msg = str(root_err).lower()
-        
-        if "network is unreachable" in err_msg or "connection" in err_msg:
-            raise HTTPException(
-                status_code=503,
-                detail=(
-                    "Unable to connect to the database. This may be due to network issues, "
-                    "IPv6 connectivity problems, or incorrect database credentials. "
-                    "For local development, consider setting up a local PostgreSQL instance. "
-                    "For Supabase, use the Connection Pooler host instead of the direct database host."
-                ),
-            ) from e
+        weather_label = f"coordinates ({request.latitude}, {request.longitude})"
+    elif request.location:
+        weather_task = asyncio.create_task(_cached_weather(request.location))
+        weather_label = request.location
+
+    query_embedding = await embed_task
+    # L2-normalize once as float32; cosine distance is scale-invariant so
+    # results are unchanged, and Postgres compares against a unit vector.
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    query_embedding /= np.linalg.norm(query_embedding) + 1e-9
+
+    # Retrieve relevant chunks — in process when the corpus is small enough,
+    # otherwise from pgvector.
+    local_index = _local_index["data"]
+    if local_index is not None:
+        contents, matrix = local_index
+        # Embeddings are normalized on load, so one matvec gives cosine
+        # similarity against the whole corpus; argpartition picks top-k.
+        scores = matrix @ query_embedding
+        if len(scores) > K_RETRIEVAL:
+            top = np.argpartition(-scores, K_RETRIEVAL)[:K_RETRIEVAL]
         else:
-            raise HTTPException(
-                status_code=503,
-                detail=f"Database error: {str(root_err)[:200]}",
-            ) from e
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        result = [contents[i] for i in top]
+    else:
+        try:
+            # Keep the HNSW candidate list small; 40 is plenty for k_retrieval=5.
+            await db.execute(text("SET LOCAL hnsw.ef_search = 40"))
+            # Fetch content only: pulling whole Document rows drags the
+            # 1536-float embedding (~6KB each) over the wire just to throw
+            # it away.
+            result = (
+                await db.execute(
+                    select(Document.content)
+                    .order_by(Document.embedding.cosine_distance(query_embedding))
+                    .limit(K_RETRIEVAL)
+                )
+            ).scalars().all()
+        except SQLAlchemyError as e:
+            # Check if this is a connection error (IPv6, network, auth, etc.)
+            root_err = getattr(e, "orig", e)
+            err_msg = str(root_err).lower()
 
-    context = "\n\n".join([doc.content for doc in result])
+            if "network is unreachable" in err_msg or "connection" in err_msg:
+                raise HTTPException(
+                    status_code=503,
+                    detail=(
+                        "Unable to connect to the database. This may be due to network issues, "
+                        "IPv6 connectivity problems, or incorrect database credentials. "
+                        "For local development, consider setting up a local PostgreSQL instance. "
+                        "For Supabase, use the Connection Pooler host instead of the direct database host."
+                    ),
+                ) from e
+            else:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Database error: {str(root_err)[:200]}",
+                ) from e
+
+    context = _bounded_join(result)
     if not context.strip():
-        return AskResponse(answer="I'm sorry, I don't have enough information to answer that question.", sources=[])
+        if weather_task is not None:
+            weather_task.cancel()
+        return {"answer": "I'm sorry, I don't have enough information to answer that question.", "sources": []}
 
 
     weather_data = None
-    if request.location:
-        weather_data = await get_weather(request.location)
-        context += f"\n\nWeather information for {request.location}:\n{weather_data}"
-    
-    if request.latitude and request.longitude:
-        weather_data = await get_weather("", lat=request.latitude, lon=request.longitude)
-        context += f"\n\nWeather information for coordinates ({request.latitude}, {request.longitude}):\n{weather_data}"
+    if weather_task is not None:
+        weather_data = await weather_task
+        context += f"\n\nWeather information for {weather_label}:\n{weather_data}"
 
     # Build prompt for answering
-    system_prompt = (
-        "You are Nile Care AI Farm Advisory, a specialized agricultural assistant. Your role is to provide concise, clear, "
-        "and informative answers based solely on the context provided. Always answer in the language requested, without "
-        "introducing any other languages. If the question cannot be answered from the provided context, acknowledge this by "
-        "saying, 'I don't know.'\n\n"
-        
-        "- **Weather inquiries**: If asked for the weather, offer a concise, accurate report based only on the available data. "
-        "Do not add extra commentary or suggestions.\n\n"
-        
-        "- **Tone & Clarity**: Your responses should be professional, easy to understand, and accurate. If the context includes "
-        "technical terms or complex concepts, simplify them for the user’s understanding while maintaining accuracy.\n\n"
-        
-        "- **Consistency & Transparency**: If you're unsure about something, communicate that clearly and refrain from guessing. "
-        "Always prioritize honesty in your responses.\n\n"
-        
-        "If the user greets you (e.g., 'Hi', 'Hello', 'Good morning'), respond in a friendly, human-like manner, such as:\n"
-        "'Hello! How can I assist you with your farming needs today?' or 'Hi there! How can I help with your agricultural questions?'"
-        
-        # Add a response for identifying the assistant
-        "If asked 'Who am I talking to?' or something similar, you should respond with: 'You are talking to Nile Care AI Farm Advisory, "
-        "your trusted agricultural assistant designed to help with farming-related queries and provide tailored guidance based on provided data.'"
-        
-        "Don't include any list just return the answer in a paragraph format."
-    )
-    
     prompt = f"""Use the following context to answer the
 
     question: {english_question}
@@ -186,7 +386,7 @@ async def ask_question(request: AskRequest, db: Session = Depends(get_db)):
     {weather_data if weather_data else 'No weather data provided.'}
     """
 
-    answer = await chat_completion(system_prompt, [{"role":"user","content":prompt}], max_tokens=512)
+    answer = await chat_completion(SYSTEM_PROMPT, [{"role":"user","content":prompt}], max_tokens=512)
     
     answer = clean_text(answer)
     
@@ -199,5 +399,5 @@ async def ask_question(request: AskRequest, db: Session = Depends(get_db)):
     # print("Answer:", answer)    
 
     sources = ["source1", "source2"]
-    return AskResponse(answer=answer, sources=sources)
+    return {"answer": answer, "sources": sources}
 
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict # type: ignore
 from urllib.parse import quote
 
@@ -19,6 +20,12 @@ class Settings(BaseSettings):
     database_sslmode: str = ""  # e.g. "require"
     k_retrieval: int = 5
 
+    # Auth
+    # bcrypt work factor; lower it on small instances if logins are too slow.
+    bcrypt_rounds: int = 10
+    # Override via JWT_SECRET in production; the default keeps local dev working.
+    jwt_secret: str = "4340aa99705e93cda93f400b78f61f56bc671ce6c23bda8235803c098832abb7"
+
     # CORS
     # Use "*" for local/dev if you are not using cookies.
     # For production, set a comma-separated list of allowed origins.
@@ -27,6 +34,7 @@ class Settings(BaseSettings):
     cors_origin_regex: str = ""
     
     allowed_file_types: list = [".pdf"]
+    max_upload_mb: int = 50
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -43,6 +51,8 @@ class Settings(BaseSettings):
 settings = Settings()
 
 
+# Settings are frozen after startup, so the URL only needs building once.
+@lru_cache(maxsize=1)
 def get_database_url() -> str:
     url = (settings.database_url or "").strip()
     if url:
@@ -19,6 +19,22 @@ def init_db():
         conn.commit()
 
     Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        # Backs the DISTINCT ON (src_file_name) query in /admin/documents.
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_documents_srcfile_created "
+            "ON documents (src_file_name, created_at DESC);"
+        ))
+        # ANN index for the /ask retrieval; without it every question is a
+        # sequential scan computing 1536-dim cosine distance per row.
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_documents_embedding_hnsw "
+            "ON documents USING hnsw (embedding vector_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64);"
+        ))
+        conn.commit()
+
     print("DB initialization completed successfully")
 
 if __name__ == "__main__":
@@ -1,10 +1,35 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 from common.config import get_database_url
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import warnings
 
 DATABASE_URL = get_database_url()
 
+
+def _async_database_url(url: str) -> tuple[str, dict]:
+    """
+    Rewrite the configured URL to use the asyncpg driver.
+
+    Returns the rewritten URL plus connect_args: asyncpg rejects the
+    libpq-style sslmode query param, but accepts the same values
+    ("require", "verify-full", ...) through its ssl connect argument.
+    """
+    if "+psycopg2" in url:
+        url = url.replace("+psycopg2", "+asyncpg")
+    elif "+asyncpg" not in url:
+        url = url.replace("postgresql://", "postgresql+asyncpg://")
+
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    params = dict(parse_qsl(query))
+    connect_args = {}
+    sslmode = params.pop("sslmode", None)
+    if sslmode:
+        connect_args["ssl"] = sslmode
+    return urlunsplit((scheme, netloc, path, urlencode(params), fragment)), connect_args
+
+
 if not DATABASE_URL:
     warnings.warn(
         "Database URL is not configured. Set DATABASE_URL or DATABASE_USER/DATABASE_PASSWORD/DATABASE_HOST/DATABASE_NAME. "
@@ -13,11 +38,31 @@ if not DATABASE_URL:
     )
     engine = None
     SessionLocal = None
+    async_engine = None
+    AsyncSessionLocal = None
 else:
-    # Use pool_pre_ping to detect stale connections, and don't fail at import time
+    # Sync engine: used by the ingestion pipeline, the Telegram bot handlers
+    # and init_db. Use pool_pre_ping to detect stale connections, and don't
+    # fail at import time.
     engine = create_engine(DATABASE_URL, echo=False, future=True, pool_pre_ping=True)
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+    # Async engine: used by the FastAPI request path. asyncpg speaks the
+    # binary protocol and pool checkouts don't block the event loop.
+    _async_url, _async_connect_args = _async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(
+        _async_url,
+        echo=False,
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        connect_args=_async_connect_args,
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
 Base = declarative_base()
 
 
@@ -32,3 +77,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError(
+            "Database is not configured. Please set DATABASE_URL or the component variables "
+            "(DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_NAME)."
+        )
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,81 @@
+# tests/test_chat_bot_helpers.py
+import unittest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import chat_bot
+from common.models.db import get_async_db
+
+
+async def _no_db():
+    # The paths under test return before touching the session.
+    yield None
+
+
+class TestBoundedJoin(unittest.TestCase):
+    def test_empty_input(self):
+        self.assertEqual(chat_bot._bounded_join([]), "")
+
+    def test_joins_when_under_limit(self):
+        self.assertEqual(chat_bot._bounded_join(["abc", "def"], max_chars=100), "abc\n\ndef")
+
+    def test_truncates_chunk_that_crosses_limit(self):
+        # First chunk fits (5 chars + 2 for the separator = 7), the second
+        # is cut to the single remaining character and iteration stops.
+        joined = chat_bot._bounded_join(["abcde", "fghij", "klmno"], max_chars=8)
+        self.assertEqual(joined, "abcde\n\nf")
+
+    def test_never_exceeds_limit(self):
+        # Includes inputs where the running total (chunk + separator padding)
+        # lands within two characters of the cap, which previously made the
+        # remainder slice negative and appended nearly a whole extra chunk.
+        for chunks in (
+            ["x" * 9, "y" * 5],
+            ["x" * 5999, "y" * 2000],
+            ["x" * 100] * 10,
+        ):
+            for max_chars in (10, 250, 6000):
+                joined = chat_bot._bounded_join(chunks, max_chars=max_chars)
+                self.assertLessEqual(len(joined), max_chars, (len(chunks), max_chars))
+
+
+class TestMultilingualGreetingRe(unittest.TestCase):
+    def test_matches_supported_greetings(self):
+        for question in ["hi", "Hello!", "hey there", "selam", "Akkam", "ሰላም", "እንዴት ነህ?"]:
+            self.assertIsNotNone(
+                chat_bot._MULTILINGUAL_GREETING_RE.search(question), question
+            )
+
+    def test_does_not_match_farming_questions(self):
+        for question in [
+            "What fertilizer suits tomatoes?",
+            "Which crops thrive in high rainfall?",
+        ]:
+            self.assertIsNone(
+                chat_bot._MULTILINGUAL_GREETING_RE.search(question), question
+            )
+
+
+class TestGreetingFastPath(unittest.TestCase):
+    def setUp(self):
+        app.dependency_overrides[get_async_db] = _no_db
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        app.dependency_overrides.pop(get_async_db, None)
+
+    def test_english_greeting(self):
+        response = self.client.post("/ask", json={"question": "hello there"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["answer"], chat_bot.GREETING_RESPONSE)
+        self.assertEqual(data["sources"], [])
+
+    def test_amharic_greeting_uses_pretranslated_response(self):
+        response = self.client.post("/ask", json={"question": "ሰላም", "lang": "am"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["answer"], chat_bot._GREETING_BY_LANG["am"])
+
+    def test_auto_lang_falls_back_to_english(self):
+        response = self.client.post("/ask", json={"question": "selam", "lang": "auto"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["answer"], chat_bot.GREETING_RESPONSE)
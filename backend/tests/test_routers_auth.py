@@ -0,0 +1,70 @@
+# tests/test_routers_auth.py
+import hashlib
+import os
+import time
+import unittest
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import auth
+from common.config import settings
+from common.models.db import get_async_db
+
+
+async def _no_db():
+    # The paths under test return before touching the session.
+    yield None
+
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+
+class TestTokenCaches(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        auth._jwt_cache.clear()
+        auth._user_cache.clear()
+
+    async def test_cached_token_and_user_skip_decode_and_db(self):
+        token = "cached-token"
+        auth._jwt_cache[_token_key(token)] = {
+            "sub": "admin@example.com",
+            "exp": time.time() + 60,
+        }
+        user = object()
+        auth._user_cache["admin@example.com"] = user
+        # db=None: a hit on both caches must not touch the database.
+        result = await auth.get_current_user(token=token, db=None)
+        self.assertIs(result, user)
+
+    async def test_expired_cached_payload_is_rejected_and_evicted(self):
+        token = "expired-token"
+        key = _token_key(token)
+        auth._jwt_cache[key] = {"sub": "admin@example.com", "exp": time.time() - 1}
+        with self.assertRaises(HTTPException) as ctx:
+            await auth.get_current_user(token=token, db=None)
+        self.assertEqual(ctx.exception.status_code, 401)
+        self.assertNotIn(key, auth._jwt_cache)
+
+
+class TestUploadSizeLimit(unittest.TestCase):
+    def setUp(self):
+        app.dependency_overrides[get_async_db] = _no_db
+        app.dependency_overrides[auth.get_current_admin_user] = lambda: object()
+        self.client = TestClient(app)
+        self._old_limit = settings.max_upload_mb
+        settings.max_upload_mb = 0
+
+    def tearDown(self):
+        settings.max_upload_mb = self._old_limit
+        app.dependency_overrides.clear()
+
+    def test_oversized_upload_is_rejected_and_removed(self):
+        response = self.client.post(
+            "/upload",
+            files={"file": ("big.pdf", b"x" * 1024, "application/pdf")},
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(os.path.exists(os.path.join(auth.UPLOAD_DIRECTORY, "big.pdf")))